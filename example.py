@@ -8,4 +8,4 @@ if __name__ == "__main__":
     clim = 3e-7                      # Can set max and min color range to stop scale varying throughout video
     loc = r"C:path\to\directory"     # Output directory
 
-    Video(f"monopole_video_test{N}_{scale}", loc=loc, N=N, scale=scale, etas=etas, delPics=True, clims=(clim, -clim))
+    Video(f"monopole_video_test{N}_{scale}", loc=loc, N=N, scale=scale, etas=etas, clims=(-clim, clim))
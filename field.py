@@ -1,7 +1,41 @@
+import contextlib
+import functools
+import os
 import numpy as np
 from scipy import fft
 import matplotlib.pyplot as plt
 
+try:
+    import pyfftw
+except ImportError:
+    pyfftw = None
+else:
+    pyfftw.interfaces.cache.enable()  # Keeps FFTW plans alive between transforms of the same shape
+
+_fftWorkers = -1  # Threads per Field FFT, negative values count back from the number of CPUs
+
+
+def setFFTWorkers(workers):
+    """
+    Sets the number of threads each Field FFT uses.
+
+    Parameters
+    ----------
+    workers : int
+        Number of threads. Negative values count back from the number of CPUs, so -1 uses all of them.
+    """
+    global _fftWorkers
+    _fftWorkers = workers
+    if pyfftw is not None:
+        pyfftw.config.NUM_THREADS = workers if workers > 0 else max(os.cpu_count() + 1 + workers, 1)
+
+
+def _fftBackend():
+    # pyFFTW when installed, otherwise whichever scipy.fft backend is already in effect
+    if pyfftw is None:
+        return contextlib.nullcontext()
+    return fft.set_backend(pyfftw.interfaces.scipy_fft)
+
 
 class Field:
     """
@@ -48,7 +82,8 @@ class Field:
         Field
             The Fourier transformed field.
         """
-        fieldFFT = fft.rfftn(self.field, norm="ortho")
+        with _fftBackend():
+            fieldFFT = fft.rfftn(self.field, norm="ortho", workers=_fftWorkers)
         return Field(fieldFFT, self.N, self.scale, "fourier")
 
     def iFFT(self):
@@ -60,9 +95,23 @@ class Field:
         Field
             The Inverse Fourier transformed field.
         """
-        field = fft.irfftn(self.field, norm="ortho")
+        with _fftBackend():
+            # s keeps odd N from losing a column
+            field = fft.irfftn(self.field, s=(self.N, self.N), norm="ortho", workers=_fftWorkers)
         return Field(field, self.N, self.scale, "physical")
 
+    def reIm(self):
+        """
+        Real valued view of a Fourier space field, with the real and imaginary parts along a trailing axis. Lets real
+        valued arithmetic act on both parts directly, without complex temporaries.
+
+        Returns
+        -------
+        ndarray
+            3D view of the field, sharing memory with self.field.
+        """
+        return self.field.view(self.field.real.dtype).reshape(self.field.shape + (2,))
+
     def kMatrix(self):
         """
         Generates 2D array of the k-values corresponding to this Field.
@@ -95,7 +144,7 @@ class Field:
         Nsamples = (kmax_round - kmin_round) * N_perLog
         return np.logspace(kmin_round, kmax_round, Nsamples)
 
-    def drawField(self, title=None, clims=None, cbar=True, units=False):
+    def drawField(self, title=None, clims=None, cbar=True, units=False, plotter=None):
         """
         Quick method for drawing Matplotlib plot field.
 
@@ -109,17 +158,25 @@ class Field:
             Display the colorbar.
         units : bool
             If True, coverts units of physical field to Kelvin, and for Fourier field converts axis units to ell values.
+        plotter : FieldPlotter
+            Existing plot to redraw with this field, in which case clims, cbar and units are taken from the plotter. A
+            new figure is made if None.
 
         Returns
         -------
         None
 
         """
+        if plotter is None:
+            plotter = FieldPlotter(clims, cbar, units)
+        plotter.draw(self, title)
+
+    def _plotData(self, units, out=None):
         if self.space == "physical":
             extent = [0, self.scale, 0, self.scale]
             if units:
                 microKelvin = 2.725e6
-                field = self.field * microKelvin
+                field = np.multiply(self.field, microKelvin, out=out)
                 cbTitle = "$\Delta\mu$K"
             else:
                 field = self.field
@@ -138,25 +195,90 @@ class Field:
                 ylabel = "$k_y$ [Mpc$^{-1}$]"
 
             extent = [0, maximum, maximum, 0]
-            field = np.abs(self.field[:self.N // 2, :])
+            field = np.abs(self.field[:self.N // 2, :], out=out)
             cbTitle = None
 
-        plt.figure()
-        plt.imshow(field, extent=extent, cmap="jet")
-        cb = plt.colorbar()
-        cb.ax.set_title(cbTitle)
-        if clims is not None:
-            plt.clim(clims[0], clims[1])
+        return field, extent, cbTitle, xlabel, ylabel
+
+
+class FieldPlotter:
+    """
+    Reusable Matplotlib plot of Fields. The figure is built on the first draw, and subsequent draws only swap the image
+    data, so all Fields drawn must share the same N, scale and space.
+
+    Attributes
+    ----------
+    clims : 2-tuple
+        Colorbar limits.
+    cbar : bool
+        Display the colorbar.
+    units : bool
+        If True, coverts units of physical field to Kelvin, and for Fourier field converts axis units to ell values.
+    fig : Figure
+        The figure drawn to, None until the first draw.
+    im : AxesImage
+        The image of the field, None until the first draw.
+    """
 
-        if not cbar:
-            cb.remove()
+    def __init__(self, clims=None, cbar=True, units=False):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        clims : 2-tuple
+            Colorbar limits.
+        cbar : bool
+            Display the colorbar.
+        units : bool
+            If True, coverts units of physical field to Kelvin, and for Fourier field converts axis units to ell values.
+        """
+        self.clims = clims
+        self.cbar = cbar
+        self.units = units
+        self.fig = None
+        self.im = None
+        self._buf = None
+
+    def draw(self, field, title=None):
+        """
+        Draws the field, reusing the figure from any previous draw.
+
+        Parameters
+        ----------
+        field : Field
+            Field to draw.
+        title : str
+            Plot title.
+
+        Returns
+        -------
+        None
+        """
+        data, extent, cbTitle, xlabel, ylabel = field._plotData(self.units, out=self._buf)
+        if data is not field.field:
+            self._buf = data  # Scaled or abs copy, reused as the output array of the next draw
+
+        if self.fig is None:
+            self.fig = plt.figure()
+            self.im = plt.imshow(data, extent=extent, cmap="jet")
+            if self.cbar:
+                cb = plt.colorbar()
+                cb.ax.set_title(cbTitle)
+            plt.xlabel(xlabel)
+            plt.ylabel(ylabel)
+        else:
+            self.im.set_data(data)
+
+        if self.clims is not None:
+            self.im.set_clim(self.clims[0], self.clims[1])
+        else:
+            self.im.autoscale()
 
         if title is not None:
-            plt.title(title)
+            self.im.axes.set_title(title)
 
-        plt.xlabel(xlabel)
-        plt.ylabel(ylabel)
-        plt.draw()
+        self.fig.canvas.draw_idle()
 
 
 class Kmatrix:
@@ -170,7 +292,7 @@ class Kmatrix:
     scale : int or float
         Physical length of field [Mpc].
     kM : ndarray
-        2D array of calculated k-values.
+        2D array of calculated k-values. Shared between instances with the same N and scale, so read-only.
     """
 
     def __init__(self, N, scale):
@@ -189,7 +311,15 @@ class Kmatrix:
         self.kM = self._kMatrix()
 
     def _kMatrix(self):
-        kx = fft.rfftfreq(self.N, d=self.scale / self.N) * 2 * np.pi
-        ky = fft.fftfreq(self.N, d=self.scale / self.N) * 2 * np.pi
-        kSqr = kx[np.newaxis, ...] ** 2 + ky[..., np.newaxis] ** 2
-        return np.sqrt(kSqr)
+        return _cachedKMatrix(self.N, self.scale)
+
+
+@functools.lru_cache(maxsize=8)
+def _cachedKMatrix(N, scale):
+    # Built once per (N, scale) and shared, so it is made read-only to stop callers mutating the cached copy
+    kx = fft.rfftfreq(N, d=scale / N) * 2 * np.pi
+    ky = fft.fftfreq(N, d=scale / N) * 2 * np.pi
+    kSqr = kx[np.newaxis, ...] ** 2 + ky[..., np.newaxis] ** 2
+    kM = np.sqrt(kSqr, out=kSqr)
+    kM.flags.writeable = False
+    return kM
@@ -1,5 +1,5 @@
 import numpy as np
-from scipy import stats, optimize
+from scipy import optimize
 import matplotlib.pyplot as plt
 
 
@@ -44,10 +44,10 @@ class ScaleInvariantPSM:
         self.psM = self._psMatrix()
 
     def _psMatrix(self):
-        self.kM[0, 0] = 1  # Avoid division by 0 where possible
-        with np.errstate(divide='ignore'):
-            psM = 2*np.pi * self.kM**(-2) * self.As * (self.kM / self.kp) ** (self.ns - 1)
-        self.kM[0, 0] = 0  # Resetting
+        # 2pi As (k/kp)^(ns-1) k^-2 folded into a single power of k, skipping the divergent k=0 point
+        psM = np.zeros_like(self.kM)
+        np.power(self.kM, self.ns - 3, out=psM, where=self.kM > 0)
+        psM *= 2*np.pi * self.As * self.kp**(1 - self.ns)
         return psM
 
 
@@ -68,7 +68,7 @@ class CalculatePS:
     psErrors : ndarray
         1D array of the error in the mean at each k-bin.
     kBins : ndarray
-        1D array of the mode k-value in each k-bin.
+        1D array of the mode k-value in each k-bin. Bins containing no modes are left out.
     As : float
         Calculated inflationary parameter.
     ns : float
@@ -77,50 +77,81 @@ class CalculatePS:
         Length 2 list containing the fit error in each calculated inflationary parameter.
     """
 
-    def __init__(self, field, raw=False, kp=0.05, bins=10):
+    def __init__(self, field=None, raw=False, kp=0.05, bins=10, logBins=False, fftField=None, kM=None):
         """
         Constructor.
 
         Parameters
         ----------
         field : Field
-            Field from which to calculate power spectrum.
+            Field from which to calculate power spectrum. Not needed if both fftField and kM are given.
         raw : bool
             Calculate 'raw' power spectrum.
         kp : float
             Pivot scale.
         bins : int
             Number of k-bins.
+        logBins : bool
+            Space the k-bins logarithmically, rather than linearly, so the low k modes are not all in the first bins.
+            The sparse low k bins are noisy, and the As and ns fit weights every bin equally, so linear bins give the
+            tighter fit.
+        fftField : Field
+            Already Fourier transformed field, e.g. FieldRealisation.fftField, to skip transforming field.
+        kM : ndarray
+            Already calculated k-values of fftField, e.g. FieldRealisation.kM, to skip rebuilding them from field.
         """
-        self.fftField = field.FFT()
-        self.kM = field.kMatrix()
+        self.fftField = fftField if fftField is not None else field.FFT()
+        self.kM = kM if kM is not None else self.fftField.kMatrix()
         self.kp = kp
         self._microKelvinSqr = (2.725e6)**2
         self._distToLastScatter = 13900
 
-        self.ps, self.psErrors, self.kBins = self._calculatePS(isRaw=raw, bins=bins)
+        self.ps, self.psErrors, self.kBins = self._calculatePS(isRaw=raw, bins=bins, isLog=logBins)
         self.As, self.ns, self.paramErrors = self._getSIParams()
 
-    def _calculatePS(self, isRaw, bins):
-        ps2D_raw = np.abs(self.fftField.field)**2
-        kFlat = self.kM.flatten()
-
-        if isRaw:
-            psFlat = (ps2D_raw).flatten()
+    def _calculatePS(self, isRaw, bins, isLog):
+        # |F|^2 as re^2 + im^2 avoids the sqrt in np.abs, and the k=0 point is dropped via views rather than copies
+        reIm = self.fftField.reIm()
+        ps2D = np.einsum('...i,...i->...', reIm, reIm)
+        psFlat = ps2D.ravel()[1:]
+        kFlat = self.kM.ravel()[1:]
+
+        if not isRaw:
+            psFlat *= kFlat
+            psFlat *= kFlat
+            psFlat /= 2*np.pi
+
+        if isLog:
+            # Binning log(k) on uniform edges gives log spaced k-bins with the same single multiply bin index
+            log_edges = np.linspace(np.log(kFlat.min()), np.log(kFlat.max()), bins + 1)
+            means, counts, stds = self._binnedStats(np.log(kFlat), psFlat, log_edges)
+            kBins = np.exp(0.5 * (log_edges[1:] + log_edges[:-1]))
         else:
-            psFlat = (kFlat**2) * (ps2D_raw).flatten() * (2*np.pi)**-1
-
-        means, bin_edges, binnumber = stats.binned_statistic(kFlat[1:], psFlat[1:], 'mean', bins=bins)
-        counts, *others = stats.binned_statistic(kFlat[1:], psFlat[1:], 'count', bins=bins)
-        stds, *others = stats.binned_statistic(kFlat[1:], psFlat[1:], 'std', bins=bins)
-        errors = stds/np.sqrt(counts)
-
-        binSeperation = bin_edges[1]
-        kBins = np.asarray([bin_edges[i] - binSeperation/2 for i in range(1, len(bin_edges))])
-
-        ps = np.asarray(means)
-
-        return ps, errors, kBins
+            bin_edges = np.linspace(kFlat.min(), kFlat.max(), bins + 1)
+            means, counts, stds = self._binnedStats(kFlat, psFlat, bin_edges)
+            kBins = 0.5 * (bin_edges[1:] + bin_edges[:-1])
+        errors = np.divide(stds, np.sqrt(counts), out=stds)
+
+        # Narrow log bins at low k can fall between the discrete |k| of the grid, so empty bins are dropped
+        filled = counts > 0
+        ps = np.asarray(means)[filled]
+
+        return ps, errors[filled], kBins[filled]
+
+    def _binnedStats(self, xFlat, psFlat, bin_edges):
+        # Mean, count and std of every uniform bin in x from one pass of bincount over count, sum and sum of squares
+        bins = len(bin_edges) - 1
+        binIndex = ((xFlat - bin_edges[0]) * (bins / (bin_edges[-1] - bin_edges[0]))).astype(np.intp)
+        np.clip(binIndex, 0, bins - 1, out=binIndex)  # Right-most edge is included in the last bin
+
+        counts = np.bincount(binIndex, minlength=bins)
+        sums = np.bincount(binIndex, weights=psFlat, minlength=bins)
+        sumSqrs = np.bincount(binIndex, weights=psFlat**2, minlength=bins)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means = sums/counts
+            stds = np.sqrt(np.maximum(sumSqrs/counts - means**2, 0))
+        return means, counts, stds
 
     def drawPS(self, title=None, siFit=False, units=False):
         """
@@ -1,10 +1,15 @@
-import copy
+import functools
 import numpy as np
-from scipy import interpolate
+from scipy import fft
 from transfers import TransferFuncs
 from powerspectrum import ScaleInvariantPSM
 from field import Field, Kmatrix
 
+try:
+    import cupy as cp
+except ImportError:
+    cp = None
+
 
 class FieldRealisation:
     """
@@ -17,17 +22,23 @@ class FieldRealisation:
         Number of pixels of array.
     scale : int or float
         Physical length of field [Mpc].
+    N_fft : int
+        Number of pixels of the Fourier grid, N rounded up to an even length with fast FFT radices.
     kM : ndarray
-        2D array of k-values.
+        2D array of k-values of the Fourier grid.
     fftField : Field
-        The momentum-space field.
+        The momentum-space field, on the Fourier grid.
     siField : Field
         The scale-invariant field.
     realField : Field
         The physical field.
+    dtype : data-type
+        Floating point precision of the generated fields.
+    useGPU : bool
+        Whether calcField evolves the field on the GPU.
     """
 
-    def __init__(self, N=1024, scale=3000):
+    def __init__(self, N=1024, scale=3000, dtype=np.float64, seed=None, useGPU=False):
         """
         Constructor.
 
@@ -37,21 +48,54 @@ class FieldRealisation:
             Number of pixels of array.
         scale : int or float
             Physical length of field [Mpc].
+        dtype : data-type
+            Floating point precision of the generated fields. np.float32 halves the memory and FFT cost, and is
+            sufficient when the fields are only being drawn.
+        seed : None or int
+            Seed for the random number generator, for reproducible realisations.
+        useGPU : bool
+            Evolve the field on the GPU with CuPy, keeping the SI transform on the device between calls of calcField.
+            Ignored if CuPy is not installed.
         """
         self.N = N
         self.scale = scale
+        self.dtype = np.dtype(dtype)
+        self._rng = np.random.Generator(np.random.PCG64DXSM(seed))
+        self.useGPU = useGPU and cp is not None
+
+        # Fields are generated on a grid padded to a fast FFT length, at the same resolution, then cropped back to N
+        self.N_fft = self._fastLength()
+        self._fftScale = scale * self.N_fft / N
 
         self.kM = self.kMatrix()
+        # The grid holds far fewer distinct |k| than modes, so transfer functions are interpolated at the sorted unique
+        # values and gathered back onto the grid
+        kUnique, kInverse = np.unique(self.kM, return_inverse=True)
+        self._kInverse = kInverse.reshape(self.kM.shape).astype(np.int32 if kUnique.size < 2**31 else np.intp)
+        with np.errstate(divide='ignore'):
+            # k=0 maps to -inf, which np.interp clamps to the first sample
+            self._logKUnique = np.log(kUnique)
+        if self.useGPU:
+            self._logKUniqueDevice = cp.asarray(self._logKUnique)
+            self._kInverseDevice = cp.asarray(self._kInverse)
 
         self._sigM = None
-        self.fftField = None
+        self._siFFTDevice = None
+        self._fftDevice = None
+        self._tfEtas = None
+        self._tfSource = None
+        self._tfLogKs = None
+        self._tfTable = None
+        self._fftField = None
         self.siField = None
         self.realField = None
 
+        self._allocBuffers()
+
     def buildSI(self, As=2.1e-9, ns=0.96, kp=0.05):
         """
-        Generates a scale invariant field based off the Power Spectrum expected from cosmic inflation. A deepcopy of the
-        physical field generated is stored at self.siField.
+        Generates a scale invariant field based off the Power Spectrum expected from cosmic inflation. The physical
+        field generated is stored at self.siField, and its Fourier transform is kept for evolving with calcField.
 
         Parameters
         ----------
@@ -67,13 +111,31 @@ class FieldRealisation:
         None
         """
         self._sigM = self._sigMatrix(As, ns, kp)
-        self.fftField = Field(self._fftMatrix(), self.N, self.scale, "fourier")
-        self.realField = self.fftField.iFFT()
-        self.siField = copy.deepcopy(self.realField)
+        self.fftField = Field(self._fftMatrix(), self.N_fft, self._fftScale, "fourier")
+        np.copyto(self._siFFTField.field, self.fftField.field)
+        if self.useGPU:
+            self._siFFTDevice = cp.asarray(self._siFFTField.field)  # Uploaded once, reused for every eta
+        self.realField = self._crop(self.fftField.iFFT())
+        self.siField = self.realField  # Never modified in place; calcField replaces realField with a new Field
+
+    @property
+    def fftField(self):
+        if self._fftDevice is not None:
+            # Evolved on the GPU, so only copied back to the host once it is asked for
+            self._fftDevice.get(out=self._evolvedFFTField.field)
+            self._fftDevice = None
+            self._fftField = self._evolvedFFTField
+        return self._fftField
+
+    @fftField.setter
+    def fftField(self, fftField):
+        self._fftDevice = None
+        self._fftField = fftField
 
     def calcField(self, eta, source="monopole", tf_raw=None):
         """
-        Evolves the field. If no transfer function is given, one will be calculated for a given eta and source.
+        Evolves the field. If no transfer function is given, the one stored by precomputeTFs is used for this eta and
+        source, and otherwise one is calculated.
 
         Parameters
         ----------
@@ -81,8 +143,8 @@ class FieldRealisation:
             Conformal time.
         source : str
             CAMB transfer function name.
-        tf_raw : TransferFuncs
-            Un-interpolated pre-calculated transfer function.
+        tf_raw : ndarray
+            Un-interpolated pre-calculated transfer function, sampled at self.siField.sampleKs().
 
         Returns
         -------
@@ -91,54 +153,161 @@ class FieldRealisation:
         if self.siField is None:
             self.buildSI()
 
-        sample_ks = self.siField.sampleKs()
         if tf_raw is None:
-            tf_raw = TransferFuncs(sample_ks, eta, source).tfs[:, 0, 0]
-        spl = interpolate.InterpolatedUnivariateSpline(sample_ks, tf_raw)
-        tf = spl(self.kM)
+            tf_raw, log_ks = self._rawTF(eta, source)
+        else:
+            log_ks = np.log(self.siField.sampleKs())
+
+        if self.useGPU:
+            self._calcFieldGPU(tf_raw, log_ks)
+            return
+
+        # Sample ks are log spaced, so linear interpolation in log(k) tracks the transfer function closely
+        tf = self._tfBuffer
+        tfUnique = np.interp(self._logKUnique, log_ks, tf_raw).astype(tf.dtype, copy=False)
+        np.take(tfUnique, self._kInverse, out=tf, mode="clip")  # Indices are all valid; "clip" lets take write to out
+
+        # Evolved directly from the stored SI transform, so no forward FFT is needed per eta. The evolved field is
+        # written into the same buffer for every eta
+        self.fftField = self._evolvedFFTField
+        # tf is real, so scale re and im directly rather than casting tf to complex
+        np.multiply(self._siFFTField.reIm(), tf[..., np.newaxis], out=self.fftField.reIm())
+        self.realField = self._crop(self.fftField.iFFT())
 
-        self.fftField = self.siField.FFT()
-        self.fftField.field *= tf
-        self.realField = self.fftField.iFFT()
+    def _calcFieldGPU(self, tf_raw, log_ks):
+        # Only the 1D transfer function goes to the device and the physical field comes back
+        tf = cp.interp(self._logKUniqueDevice, cp.asarray(log_ks), cp.asarray(tf_raw))[self._kInverseDevice]
+        fftM = self._siFFTDevice * tf.astype(self.dtype, copy=False)
+        self._fftDevice = fftM
+        realM = cp.fft.irfft2(fftM, s=(self.N_fft, self.N_fft), norm="ortho")
+        self.realField = self._crop(Field(cp.asnumpy(realM), self.N_fft, self._fftScale, "physical"))
+
+    def precomputeTFs(self, etas, source="monopole", ks=None):
+        """
+        Calculates the transfer functions for many conformal times with a single CAMB call, so that calcField only has
+        to interpolate for any of these etas.
+
+        Parameters
+        ----------
+        etas : list or ndarray
+            Conformal times.
+        source : str
+            CAMB transfer function name.
+        ks : list or ndarray
+            Sample k-values at which the transfer functions are calculated. Defaults to self.siField.sampleKs().
+
+        Returns
+        -------
+        None
+        """
+        if ks is None:
+            if self.siField is None:
+                self.buildSI()
+            ks = self.siField.sampleKs()
+
+        self._tfEtas = np.asarray(etas)
+        self._tfSource = source
+        self._tfLogKs = np.log(ks)
+        self._tfTable = np.ascontiguousarray(TransferFuncs(ks, etas, source).tfs[:, :, 0].T)  # Row per eta
 
     def kMatrix(self):
         """
-        Generates 2D array of the k-values corresponding to these Fields.
+        Generates 2D array of the k-values corresponding to the Fourier grid of these Fields.
 
         Returns
         -------
         ndarray
             2D array of k-values.
         """
-        return Kmatrix(self.N, self.scale).kM
+        return Kmatrix(self.N_fft, self._fftScale).kM
+
+    def _allocBuffers(self):
+        # Arrays reused by every calcField, allocated once as their shapes are fixed by the Fourier grid. They are views
+        # of one block, laid out in the order calcField streams them: SI transform, transfer function, evolved transform
+        fftShape = (self.N_fft, self.N_fft//2 + 1)
+        size = fftShape[0] * fftShape[1]
+        complexType = np.promote_types(self.dtype, np.complex64)
+        storage = np.empty(5 * size, dtype=self.dtype)  # Real dtype matches the field, so scaling by tf never upcasts
+
+        siFFTM = storage[:2*size].view(complexType).reshape(fftShape)
+        self._siFFTField = Field(siFFTM, self.N_fft, self._fftScale, "fourier")
+        self._tfBuffer = storage[2*size:3*size].reshape(fftShape)
+        fftM = storage[3*size:].view(complexType).reshape(fftShape)
+        self._evolvedFFTField = Field(fftM, self.N_fft, self._fftScale, "fourier")
+
+    def __setstate__(self, state):
+        # Pickling copies each view of the storage block into its own array, so the block is carved out again
+        self.__dict__.update(state)
+        siFFTM, tf, fftM = self._siFFTField.field, self._tfBuffer, self._evolvedFFTField.field
+        wasEvolved = self._fftField is self._evolvedFFTField
+        self._allocBuffers()
+        np.copyto(self._siFFTField.field, siFFTM)
+        np.copyto(self._tfBuffer, tf)
+        np.copyto(self._evolvedFFTField.field, fftM)
+        if wasEvolved:
+            self._fftField = self._evolvedFFTField
+
+    def _rawTF(self, eta, source):
+        if self._tfTable is not None and source == self._tfSource:
+            iii = np.flatnonzero(self._tfEtas == eta)
+            if iii.size:
+                return self._tfTable[iii[0]], self._tfLogKs
+
+        sample_ks = self.siField.sampleKs()
+        return TransferFuncs(sample_ks, np.atleast_1d(eta), source).tfs[:, 0, 0], np.log(sample_ks)
+
+    def _fastLength(self):
+        # Symmetry enforcement assumes a Nyquist row/column, so only even fast lengths are accepted
+        n = fft.next_fast_len(self.N, real=True)
+        while n % 2:
+            n = fft.next_fast_len(n + 1, real=True)
+        return n
+
+    def _crop(self, field):
+        if self.N_fft == self.N:
+            return field
+        return Field(field.field[:self.N, :self.N].copy(), self.N, self.scale, "physical")
 
     def _sigMatrix(self, As, ns, kp):
-        psM = ScaleInvariantPSM(self.kM, As, ns, kp).psM
-        return np.sqrt(psM)/np.sqrt(2)   # Dividing by sqrt(2) to account for the fft field being complex valued
+        return _cachedSigMatrix(self.N_fft, self._fftScale, As, ns, kp, self.dtype)
 
     def _complexGaussMatrix(self, mu=0, sig=1):
-        x = np.random.normal(mu, sig, (self.N, self.N//2 + 1))
-        y = np.random.normal(mu, sig, (self.N, self.N//2 + 1))
-        return x + (y * 1j)
+        # Real and imaginary parts are drawn together along a trailing axis and viewed as complex without a copy
+        xy = self._rng.standard_normal((self.N_fft, self.N_fft//2 + 1, 2), dtype=self.dtype)
+        if (mu, sig) != (0, 1):
+            xy *= sig
+            xy += mu
+        return xy.view(np.promote_types(self.dtype, np.complex64))[..., 0]
 
     def _fftMatrix(self):
-        gaussM = self._complexGaussMatrix()
-        return self._enforceRealSymmetries(gaussM * self._sigM)
+        # Scaled and symmetrised in place, so the Gaussian draw is the only full size buffer
+        fftM = self._complexGaussMatrix()
+        fftM *= self._sigM
+        return self._enforceRealSymmetries(fftM)
 
     def _enforceRealSymmetries(self, fftM):
+        half = self.N_fft//2
 
         # Setting divergent point to 0 (this point represents mean of real field so this is reasonable)
         fftM[0, 0] = 0
 
         # Ensuring Nyquist points are real
-        fftM[self.N//2, 0] = np.real(fftM[self.N//2, 0]) * np.sqrt(2)
-        fftM[0, self.N//2] = np.real(fftM[0, self.N//2]) * np.sqrt(2)
-        fftM[self.N//2, self.N//2] = np.real(fftM[self.N//2, self.N//2]) * np.sqrt(2)
-
-        # +ve k_y mirrors -ve k_y at k_x = 0
-        fftM[self.N//2 + 1:, 0] = np.conjugate(fftM[1:self.N//2, 0][::-1])
+        nyquist = ([half, 0, half], [0, half, half])
+        fftM[nyquist] = fftM[nyquist].real * np.sqrt(2)
 
-        # +ve k_y mirrors -ve k_y at k_x = N/2 (Nyquist freq) !!!!!!!!!!! Why?
-        fftM[self.N//2 + 1:, -1] = np.conjugate(fftM[1:self.N//2, -1][::-1])
+        # +ve k_y mirrors -ve k_y at k_x = 0 and k_x = N/2 (Nyquist freq), written straight into both columns. These are
+        # the only columns the real FFT stores both k and -k for; every other stored mode is independent
+        np.conjugate(fftM[half - 1:0:-1, ::half], out=fftM[half + 1:, ::half])
 
         return fftM
+
+
+@functools.lru_cache(maxsize=8)
+def _cachedSigMatrix(N, scale, As, ns, kp, dtype):
+    # Shared by every realisation with the same grid and inflation parameters, so made read-only like the k-matrix
+    sigM = ScaleInvariantPSM(Kmatrix(N, scale).kM, As, ns, kp).psM
+    np.sqrt(sigM, out=sigM)
+    sigM *= 1/np.sqrt(2)   # Dividing by sqrt(2) to account for the fft field being complex valued
+    sigM = sigM.astype(dtype, copy=False)
+    sigM.flags.writeable = False
+    return sigM
@@ -1,3 +1,4 @@
+import functools
 import camb
 from camb.symbolic import *
 
@@ -38,10 +39,7 @@ class TransferFuncs:
         self.tfs = self._generateFuncs()
 
     def _generateFuncs(self):
-        pars = camb.CAMBparams()
-        #pars.set_accuracy(AccuracyBoost=2)
-        pars.set_cosmology(H0=67.5, ombh2=0.022, omch2=0.122)
-        data = camb.get_transfer_functions(pars)
+        data = _cambData(H0=67.5, ombh2=0.022, omch2=0.122)
 
         if self.source == "monopole":
             monopole_source = get_scalar_temperature_sources()[0]
@@ -49,4 +47,13 @@ class TransferFuncs:
             return transferFuncs
 
         transferFuncs = data.get_time_evolution(self.ks, self.etas, [self.source])
-        return transferFuncs
\ No newline at end of file
+        return transferFuncs
+
+
+@functools.lru_cache(maxsize=4)
+def _cambData(H0, ombh2, omch2):
+    # The cosmology solve takes seconds and only depends on these parameters, so it is shared by every TransferFuncs
+    pars = camb.CAMBparams()
+    #pars.set_accuracy(AccuracyBoost=2)
+    pars.set_cosmology(H0=H0, ombh2=ombh2, omch2=omch2)
+    return camb.get_transfer_functions(pars)
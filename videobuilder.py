@@ -1,12 +1,16 @@
+import numpy as np
 import matplotlib.pyplot as plt
 from realisation import FieldRealisation
-from transfers import TransferFuncs
+from field import setFFTWorkers
 import os
-import platform
+import subprocess
+import collections
+import warnings
+from concurrent.futures import ProcessPoolExecutor
 
 class Video:
     """
-    Generates video of monopole source evolution, and saves output as mp3 file.
+    Generates video of monopole source evolution, and saves output as mp4 file.
 
     Attributes
     ----------
@@ -23,10 +27,15 @@ class Video:
     etas : list or ndarray
         Sample conformal times at which transfer function is calculated at.
     clims : 2-tuple
-        Colorbar limits.
+        Colorbar limits, as (min, max).
+    processes : int
+        Number of processes drawing frames.
+    seed : None or int
+        Seed of the field realisation.
     """
 
-    def __init__(self, name, loc, N=1024, scale=1000, ks=None, etas=range(1,300), delPics=True, clims=None):
+    def __init__(self, name, loc, N=1024, scale=1000, ks=None, etas=range(1,300), delPics=None, clims=None,
+                 processes=None, seed=None):
         """
         Constructor.
 
@@ -45,9 +54,13 @@ class Video:
         etas : list or ndarray
             Sample conformal times at which transfer function is calculated at.
         delPics : bool
-            Delete directory containing png snapshots.
+            Deprecated and ignored. Frames are piped straight into ffmpeg, so there are no png snapshots to delete.
         clims : 2-tuple
-            Colorbar limits.
+            Colorbar limits, as (min, max).
+        processes : int
+            Number of processes drawing frames. Defaults to the number of CPUs.
+        seed : None or int
+            Seed of the field realisation, for reproducible videos.
         """
         self.name = name
         self.loc = loc
@@ -56,60 +69,112 @@ class Video:
         self.ks = ks
         self.etas = etas
         self.clims = clims
-        self._fileSep = self._getFileSep()
+        self.processes = processes
+        self.seed = seed
 
-        picDir = self._buildVideo()
+        if delPics is not None:
+            warnings.warn("delPics no longer has any effect, as no png snapshots are written", DeprecationWarning,
+                          stacklevel=2)
 
-        if delPics:
-            self._delDir(picDir)
-
-    def _getFileSep(self):
-        if platform.system() == "Windows":
-            return r"\\"
-        else:
-            return r"/"
+        self._buildVideo()
 
     def _buildVideo(self):
-        fr = FieldRealisation(self.N, self.scale)
+        if len(self.etas) == 0:
+            raise ValueError("etas is empty, so there are no frames to make a video from")
+
+        # Frames are display-only, so single precision is enough
+        fr = FieldRealisation(self.N, self.scale, dtype=np.float32, seed=self.seed)
         fr.buildSI()
 
         if self.ks is None:
             self.ks = fr.siField.sampleKs()
 
-        picDir = self._drawPics(fr)
-
-        os.chdir(os.getcwd())
-        os.chdir(self.loc)
-        files = picDir + self._fileSep + "field_%02d.png"
-        os.system(fr'ffmpeg -i {files} -filter:v "setpts=2*PTS" -r 30 -pix_fmt yuv420p -y {self.name}.mp4')
-
-        return picDir
-
-    def _drawPics(self, fr):
-        dir = fr"{self.loc + self._fileSep}pics_{self.N}_{self.scale}"
-        if not os.path.isdir(self.loc):
-            os.mkdir(self.loc)
-            os.mkdir(dir)
-        elif not os.path.isdir(dir):
-            os.mkdir(dir)
-
-        tf_raw = TransferFuncs(self.ks, self.etas).tfs[:, :, 0]
-        for iii, eta in enumerate(self.etas):
-
-            fr.calcField(eta, tf_raw=tf_raw[:,iii])
-            fr.realField.drawField(clims=self.clims, cbar=False)
-
-            plt.gca().set_axis_off()
-            plt.subplots_adjust(top=1, bottom=0, right=1, left=0, hspace=0, wspace=0)
-            plt.margins(0, 0)
-            plt.gca().xaxis.set_major_locator(plt.NullLocator())
-            plt.gca().yaxis.set_major_locator(plt.NullLocator())
-            plt.savefig(rf"{dir + self._fileSep}field_%02d.png" % eta, bbox_inches='tight', pad_inches=0)
-
-            plt.close()
-        return dir
-
-    def _delDir(self, dir):
-        os.chdir(os.getcwd())
-        os.chdir(self.loc)
-        os.system(f"rd /Q /S {dir}")
+        os.makedirs(self.loc, exist_ok=True)
+
+        # Frames are piped straight into ffmpeg as raw RGB, so nothing is encoded to or read back from disk
+        ffmpeg = None
+        frames = self._drawFrames(fr)
+        try:
+            for frame in frames:
+                if ffmpeg is None:
+                    ffmpeg = self._openFFmpeg(frame.shape[1], frame.shape[0])
+                ffmpeg.stdin.write(frame.tobytes())
+        except BrokenPipeError as e:
+            # ffmpeg exited before taking every frame
+            raise subprocess.CalledProcessError(ffmpeg.wait(), ffmpeg.args) from e
+        except BaseException:
+            if ffmpeg is not None:
+                ffmpeg.kill()
+            raise
+        finally:
+            frames.close()
+            if ffmpeg is not None:
+                try:
+                    ffmpeg.stdin.close()
+                except BrokenPipeError:
+                    pass
+                ffmpeg.wait()
+
+        if ffmpeg.returncode != 0:
+            raise subprocess.CalledProcessError(ffmpeg.returncode, ffmpeg.args)
+
+    def _openFFmpeg(self, width, height):
+        # Input at ffmpeg's default image rate of 25, slowed by setpts and output at 30 fps
+        args = ["ffmpeg", "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}", "-r", "25", "-i", "-",
+                "-filter:v", "setpts=2*PTS", "-r", "30", "-pix_fmt", "yuv420p", "-y",
+                os.path.join(self.loc, f"{self.name}.mp4")]
+        return subprocess.Popen(args, stdin=subprocess.PIPE)
+
+    def _drawFrames(self, fr):
+        # Frames are independent, so each process gets its own copy of the realisation and draws a share of the etas
+        fr.precomputeTFs(self.etas, ks=self.ks)
+        lut = np.round(plt.get_cmap("jet", 256)(np.arange(256))[:, :3] * 255).astype(np.uint8)
+        processes = self.processes or os.cpu_count()
+        etas = iter(self.etas)
+        with ProcessPoolExecutor(processes, initializer=_initFrameWorker, initargs=(fr, self.clims, lut)) as executor:
+            # Only a bounded window of frames is in flight, so drawn frames never pile up ahead of ffmpeg
+            pending = collections.deque(executor.submit(_drawFrame, eta) for _, eta in zip(range(2*processes), etas))
+            try:
+                while pending:
+                    frame = pending.popleft().result()
+                    for eta in etas:
+                        pending.append(executor.submit(_drawFrame, eta))
+                        break
+                    yield frame
+            finally:
+                for future in pending:
+                    future.cancel()
+
+
+_frameWorker = {}
+
+
+def _initFrameWorker(fr, clims, lut):
+    setFFTWorkers(1)  # Parallelism comes from the worker processes, so threaded FFTs would only oversubscribe the CPUs
+    _frameWorker["fr"] = fr
+    _frameWorker["clims"] = clims
+    _frameWorker["lut"] = lut
+
+
+def _drawFrame(eta):
+    # Colour mapped directly through a 256 entry lookup table, binned as Matplotlib's imshow does, so every frame is
+    # exactly N x N pixels without going through a figure
+    fr = _frameWorker["fr"]
+    fr.calcField(eta)
+    field = fr.realField.field
+
+    if _frameWorker["clims"] is not None:
+        vmin, vmax = _frameWorker["clims"]
+        if vmin > vmax:
+            raise ValueError(f"clims must be (min, max), got {_frameWorker['clims']}")
+    else:
+        vmin, vmax = field.min(), field.max()
+
+    if vmax == vmin:
+        # A flat frame has no range to scale by, and Matplotlib draws it in the first colour
+        return np.broadcast_to(_frameWorker["lut"][0], field.shape + (3,))
+
+    binned = field - vmin
+    binned *= 256 / (vmax - vmin)
+    np.clip(binned, 0, 255, out=binned)
+    return _frameWorker["lut"][binned.astype(np.uint8)]